@@ -5,24 +5,29 @@ Check exactly where credentials are coming from
 
 import os
 import sys
+from concurrent.futures import ThreadPoolExecutor
 sys.path.append('src')
 
 def check_credential_sources():
     print("🔍 Checking credential sources...")
     print("=" * 50)
     
+    # Snapshot the process env once (before config.py's load_dotenv can add to it)
+    env = {k: os.environ.get(k) for k in ('GMAIL_REFRESH_RAW_B64', 'GMAIL_REFRESH_B64', 'GOOGLE_CLIENT_ID_B64',
+                                          'GOOGLE_CLIENT_SECRET_B64', 'GOOGLE_CLOUD_PROJECT')}
+    
     # Check environment variables first
     print("1. Environment Variables:")
-    env_vars = ['GMAIL_REFRESH_B64', 'GOOGLE_CLIENT_ID_B64', 'GOOGLE_CLIENT_SECRET_B64']
+    env_vars = ['GMAIL_REFRESH_RAW_B64', 'GMAIL_REFRESH_B64', 'GOOGLE_CLIENT_ID_B64', 'GOOGLE_CLIENT_SECRET_B64']
     for var in env_vars:
-        value = os.getenv(var)
+        value = env[var]
         if value:
             print(f"   ✅ {var}: Found (length: {len(value)})")
         else:
             print(f"   ❌ {var}: Not found")
     
     print("\n2. Google Cloud Project:")
-    project = os.getenv('GOOGLE_CLOUD_PROJECT')
+    project = env['GOOGLE_CLOUD_PROJECT']
     print(f"   Project: {project}")
     
     print("\n3. Testing Secret Manager access:")
@@ -39,19 +44,30 @@ def check_credential_sources():
             print(f"   ✅ Secret Manager accessible")
             print(f"   Available secrets: {secret_names}")
             
-            # Test specific secrets
-            gmail_secrets = ['gmail-refresh-token', 'gmail-client-id', 'gmail-client-secret']
+            # Test specific secrets – fetch the ones that exist concurrently
+            gmail_secrets = ['gmail-refresh-token-raw', 'gmail-refresh-token', 'gmail-client-id', 'gmail-client-secret']
+            tasks = [(name, f"projects/{project}/secrets/{name}/versions/latest")
+                     for name in gmail_secrets if name in secret_names]
+
+            def access(secret_path):
+                try:
+                    return client.access_secret_version(name=secret_path).payload.data.decode()
+                except Exception as e:
+                    return e
+
+            results = {}
+            if tasks:
+                with ThreadPoolExecutor(max_workers=len(tasks)) as ex:
+                    payloads = ex.map(access, [path for _, path in tasks])
+                    results = dict(zip([name for name, _ in tasks], payloads))
+
             for secret_name in gmail_secrets:
-                if secret_name in secret_names:
-                    try:
-                        secret_path = f"projects/{project}/secrets/{secret_name}/versions/latest"
-                        response = client.access_secret_version(name=secret_path)
-                        payload = response.payload.data.decode()
-                        print(f"   ✅ {secret_name}: Retrieved (length: {len(payload)})")
-                    except Exception as e:
-                        print(f"   ❌ {secret_name}: Error retrieving - {e}")
-                else:
+                if secret_name not in results:
                     print(f"   ❌ {secret_name}: Not found in secrets")
+                elif isinstance(results[secret_name], Exception):
+                    print(f"   ❌ {secret_name}: Error retrieving - {results[secret_name]}")
+                else:
+                    print(f"   ✅ {secret_name}: Retrieved (length: {len(results[secret_name])})")
                     
         except Exception as e:
             print(f"   ❌ Secret Manager error: {e}")
@@ -61,9 +77,10 @@ def check_credential_sources():
     print("\n4. Config loading test:")
     try:
         from src.config import cfg
-        print(f"   REFRESH_B64 source: {'Environment' if os.getenv('GMAIL_REFRESH_B64') else 'Secret Manager or missing'}")
-        print(f"   CLIENT_ID_B64 source: {'Environment' if os.getenv('GOOGLE_CLIENT_ID_B64') else 'Secret Manager or missing'}")
-        print(f"   CLIENT_SECRET_B64 source: {'Environment' if os.getenv('GOOGLE_CLIENT_SECRET_B64') else 'Secret Manager or missing'}")
+        print(f"   REFRESH_RAW_B64 source: {'Environment' if env['GMAIL_REFRESH_RAW_B64'] else '.env, Secret Manager or missing'}")
+        print(f"   REFRESH_B64 source: {'Environment' if env['GMAIL_REFRESH_B64'] else '.env, Secret Manager or missing'}")
+        print(f"   CLIENT_ID_B64 source: {'Environment' if env['GOOGLE_CLIENT_ID_B64'] else '.env, Secret Manager or missing'}")
+        print(f"   CLIENT_SECRET_B64 source: {'Environment' if env['GOOGLE_CLIENT_SECRET_B64'] else '.env, Secret Manager or missing'}")
         
         # Show first few chars to confirm they're different sources
         if cfg.REFRESH_B64:
@@ -5,31 +5,35 @@ Gmail Authentication Diagnostics
 Step-by-step checks to diagnose Gmail OAuth issues
 """
 
+import asyncio
+import json
 import sys
 import os
-import json
-import base64
-import requests
+import httpx
 sys.path.append('src')
 
-from src.config import cfg
+from src.config import get_cfg
+from src.constants import STATE_FILE
+
+GMAIL_API = 'https://gmail.googleapis.com/gmail/v1/users/me'
 
 def check_credentials_loaded():
     """Step 1: Check if credentials are loaded from config"""
     print("🔍 Step 1: Checking credential loading...")
     
     try:
-        has_refresh = bool(cfg.REFRESH_B64)
+        cfg = get_cfg()  # first access pays the Secret Manager round trips
+        has_refresh = bool(cfg.REFRESH_RAW_B64 or cfg.REFRESH_B64)
         has_client_id = bool(cfg.CLIENT_ID_B64)
         has_client_secret = bool(cfg.CLIENT_SECRET_B64)
         
-        print(f"  REFRESH_B64: {'✅ Loaded' if has_refresh else '❌ Missing'}")
+        print(f"  REFRESH_RAW_B64 / REFRESH_B64: {'✅ Loaded' if has_refresh else '❌ Missing'}")
         print(f"  CLIENT_ID_B64: {'✅ Loaded' if has_client_id else '❌ Missing'}")
         print(f"  CLIENT_SECRET_B64: {'✅ Loaded' if has_client_secret else '❌ Missing'}")
         
         if has_refresh:
             # Decode and show first few chars
-            rt = json.loads(base64.b64decode(cfg.REFRESH_B64))['refresh_token']
+            rt = cfg.refresh_token
             print(f"  Refresh token preview: {rt[:15]}...")
             
         return has_refresh and has_client_id and has_client_secret
@@ -42,13 +46,13 @@ def check_token_format():
     print("\n🔍 Step 2: Checking token format...")
     
     try:
-        # Decode refresh token
-        refresh_data = json.loads(base64.b64decode(cfg.REFRESH_B64))
-        rt = refresh_data['refresh_token']
+        cfg = get_cfg()
+        # Decode refresh token (raw or legacy JSON format)
+        rt = cfg.refresh_token
         
         # Decode client credentials
-        client_id = base64.b64decode(cfg.CLIENT_ID_B64).decode()
-        client_secret = base64.b64decode(cfg.CLIENT_SECRET_B64).decode()
+        client_id = cfg.client_id
+        client_secret = cfg.client_secret
         
         print(f"  Refresh token format: {'✅ Valid' if rt and rt.startswith('1//') else '❌ Invalid'}")
         print(f"  Client ID format: {'✅ Valid' if '.apps.googleusercontent.com' in client_id else '❌ Invalid'}")
@@ -59,7 +63,7 @@ def check_token_format():
         print(f"  ❌ Error parsing tokens: {e}")
         return None, None, None
 
-def test_manual_token_refresh(refresh_token, client_id, client_secret):
+async def test_manual_token_refresh(client, refresh_token, client_id, client_secret):
     """Step 3: Test direct OAuth refresh call"""
     print("\n🔍 Step 3: Testing manual token refresh...")
     
@@ -72,7 +76,7 @@ def test_manual_token_refresh(refresh_token, client_id, client_secret):
             'client_secret': client_secret
         }
         
-        response = requests.post('https://oauth2.googleapis.com/token', data=data)
+        response = await client.post('https://oauth2.googleapis.com/token', data=data)
         
         if response.status_code == 200:
             result = response.json()
@@ -100,7 +104,42 @@ def test_manual_token_refresh(refresh_token, client_id, client_secret):
         print(f"  ❌ Request failed: {e}")
         return None
 
-def test_gmail_api_call(access_token):
+async def probe_profile(client, headers):
+    """Fetch the mailbox profile (address + message count)"""
+    response = await client.get(f'{GMAIL_API}/profile', headers=headers)
+    if response.status_code != 200:
+        return False, [f"❌ Profile failed: {response.status_code}", f"Response: {response.text}"]
+    profile = response.json()
+    return True, [
+        "✅ Gmail API working!",
+        f"Email: {profile['emailAddress']}",
+        f"Total messages: {profile['messagesTotal']}",
+    ]
+
+async def probe_labels(client, headers):
+    """List labels and show which AI/* labels already exist"""
+    response = await client.get(f'{GMAIL_API}/labels', headers=headers)
+    if response.status_code != 200:
+        return False, [f"❌ Labels failed: {response.status_code}", f"Response: {response.text}"]
+    names = [lab['name'] for lab in response.json().get('labels', [])]
+    ai_labels = [name for name in names if name.startswith('AI/')]
+    return True, [f"✅ Labels: {len(names)} total, AI labels: {ai_labels or 'none yet'}"]
+
+async def probe_history(client, headers):
+    """Check the saved watch checkpoint is still inside Gmail's history window"""
+    try:
+        last_id = json.loads(STATE_FILE.read_text())['last_id']
+    except (OSError, ValueError, KeyError):
+        return True, [f"⏭️ History: no checkpoint in {STATE_FILE.name}, skipping"]
+    response = await client.get(f'{GMAIL_API}/history', headers=headers,
+                                params={'startHistoryId': last_id, 'maxResults': 1})
+    if response.status_code == 404:
+        return False, [f"❌ History: checkpoint {last_id} has expired - re-run scripts/create_watch.py"]
+    if response.status_code != 200:
+        return False, [f"❌ History failed: {response.status_code}", f"Response: {response.text}"]
+    return True, [f"✅ History: checkpoint {last_id} is valid"]
+
+async def test_gmail_api_call(client, access_token):
     """Step 4: Test Gmail API with fresh access token"""
     print("\n🔍 Step 4: Testing Gmail API access...")
     
@@ -108,30 +147,31 @@ def test_gmail_api_call(access_token):
         print("  ⏭️ Skipping - no valid access token")
         return False
         
-    try:
-        headers = {
-            'Authorization': f'Bearer {access_token}',
-            'Accept': 'application/json'
-        }
-        
-        # Test getting user profile
-        response = requests.get('https://gmail.googleapis.com/gmail/v1/users/me/profile', headers=headers)
-        
-        if response.status_code == 200:
-            profile = response.json()
-            print(f"  ✅ Gmail API working!")
-            print(f"  Email: {profile['emailAddress']}")
-            print(f"  Total messages: {profile['messagesTotal']}")
-            return True
-        else:
-            print(f"  ❌ Gmail API failed: {response.status_code}")
-            print(f"  Response: {response.text}")
-            return False
-    except Exception as e:
-        print(f"  ❌ Gmail API test failed: {e}")
-        return False
+    headers = {
+        'Authorization': f'Bearer {access_token}',
+        'Accept': 'application/json'
+    }
+    
+    # Independent probes run concurrently; output is printed in a fixed order
+    results = await asyncio.gather(
+        probe_profile(client, headers),
+        probe_labels(client, headers),
+        probe_history(client, headers),
+        return_exceptions=True,
+    )
+    all_ok = True
+    for result in results:
+        if isinstance(result, Exception):
+            print(f"  ❌ Gmail API test failed: {result}")
+            all_ok = False
+            continue
+        ok, lines = result
+        all_ok = all_ok and ok
+        for line in lines:
+            print(f"  {line}")
+    return all_ok
 
-def main():
+async def main():
     print("Gmail Authentication Diagnostics")
     print("=" * 50)
     
@@ -146,11 +186,13 @@ def main():
         print("\n❌ Cannot proceed - invalid credential format")
         return
     
-    # Step 3: Test refresh
-    access_token = test_manual_token_refresh(refresh_token, client_id, client_secret)
-    
-    # Step 4: Test Gmail API
-    test_gmail_api_call(access_token)
+    # One HTTP/2 client so the Google endpoints multiplex over a shared connection
+    async with httpx.AsyncClient(http2=True, timeout=30) as client:
+        # Step 3: Test refresh
+        access_token = await test_manual_token_refresh(client, refresh_token, client_id, client_secret)
+        
+        # Step 4: Test Gmail API
+        await test_gmail_api_call(client, access_token)
     
     print("\n" + "=" * 50)
     if access_token:
@@ -165,4 +207,4 @@ def main():
         print("   4. Check Google Cloud Console OAuth app is still active")
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    asyncio.run(main())
\ No newline at end of file
@@ -8,18 +8,27 @@ import base64
 import pathlib
 from google_auth_oauthlib.flow import InstalledAppFlow
 
+try:
+    import orjson
+    _loads, _dumps = orjson.loads, orjson.dumps     # bytes in/out, no extra .encode()
+except ImportError:
+    _loads, _dumps = json.loads, lambda obj: json.dumps(obj).encode()
+
 SCOPES = ["https://www.googleapis.com/auth/gmail.modify"]
 ROOT = pathlib.Path(__file__).resolve().parent
 CLIENT_FILE = ROOT / "oauth_client.json"
 
 def main():
-    if not CLIENT_FILE.exists():
+    # Read + parse the client file once (no separate exists() check and re-open)
+    try:
+        client_config = _loads(CLIENT_FILE.read_bytes())
+    except FileNotFoundError:
         print(f"❌ {CLIENT_FILE} not found")
         return
     
     print("🔗 Getting OAuth URL...")
     
-    flow = InstalledAppFlow.from_client_secrets_file(str(CLIENT_FILE), SCOPES)
+    flow = InstalledAppFlow.from_client_config(client_config, SCOPES)
     
     # Get the authorization URL
     auth_url, _ = flow.authorization_url(prompt='consent')
@@ -49,13 +58,17 @@ def main():
         return
     
     payload = {"refresh_token": creds.refresh_token}
-    b64_payload = base64.b64encode(json.dumps(payload).encode()).decode()
+    raw_b64 = base64.b64encode(creds.refresh_token.encode()).decode()
+    b64_payload = base64.b64encode(_dumps(payload)).decode()
     
     print(f"\n✅ SUCCESS! Here's your refresh token:")
-    print(f"\n🔑 Base64 encoded for Secret Manager:")
+    print(f"\n🔑 Base64 encoded for Secret Manager (GMAIL_REFRESH_RAW_B64):")
+    print(f"{raw_b64}")
+    print(f"\n🔑 Legacy JSON format (GMAIL_REFRESH_B64):")
     print(f"{b64_payload}")
     
     print(f"\n📋 To update Secret Manager, run:")
+    print(f"gcloud secrets versions add gmail-refresh-token-raw --data-file=- <<< '{raw_b64}'")
     print(f"gcloud secrets versions add gmail-refresh-token --data-file=- <<< '{b64_payload}'")
     
     # Also show raw JSON
@@ -3,7 +3,8 @@
 create_watch.py -- create a Gmail Pub/Sub watch and push subscription
 """
 from __future__ import annotations
-import argparse, pathlib, os, json
+import argparse, hashlib, pathlib, os, json
+from datetime import datetime, timedelta, timezone
 
 import googleapiclient.errors
 from google.oauth2.credentials import Credentials
@@ -16,19 +17,57 @@ from google.api_core.exceptions import AlreadyExists, NotFound
 from src.constants import STATE_FILE
 
 SCOPES = ["https://www.googleapis.com/auth/gmail.modify"]
-
-def ensure_label(gmail, label_name: str) -> str:
-    # Return the label ID, creating it if needed
-    labels_resp = gmail.users().labels().list(userId="me").execute()
-    for lbl in labels_resp["labels"]:
-        if lbl["name"] == label_name:
-            return lbl["id"]
+TOKEN_CACHE = pathlib.Path.home() / ".cache" / "smart-inbox" / "access.json"
+
+def _fingerprint(refresh_token: str) -> str:
+    # Ties a cached access token to the refresh token (i.e. mailbox) that minted it
+    return hashlib.sha256(refresh_token.encode()).hexdigest()[:16]
+
+def load_cached_token(refresh_token: str) -> tuple[str, datetime] | None:
+    """Return (access_token, expiry) if the on-disk token is ours and valid for >60s."""
+    try:
+        data = json.loads(TOKEN_CACHE.read_text())
+        if data["fingerprint"] != _fingerprint(refresh_token):
+            return None
+        expiry = datetime.fromisoformat(data["expiry_iso"])  # naive UTC, like google-auth
+    except (OSError, ValueError, KeyError):
+        return None
+    now = datetime.now(timezone.utc).replace(tzinfo=None)
+    if expiry - now <= timedelta(seconds=60):
+        return None
+    return data["access_token"], expiry
+
+def save_cached_token(creds: Credentials) -> None:
+    """Persist the fresh access token owner-only so back-to-back runs skip the refresh."""
+    try:
+        TOKEN_CACHE.parent.mkdir(parents=True, exist_ok=True, mode=0o700)
+        fd = os.open(TOKEN_CACHE, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(fd, "w") as fh:
+            json.dump({
+                "access_token": creds.token,
+                "expiry_iso": creds.expiry.isoformat(),
+                "fingerprint": _fingerprint(creds.refresh_token),
+            }, fh)
+    except OSError as e:
+        print(f"⚠️  could not cache access token: {e}")
+
+def ensure_label(gmail, label_name: str, labels_cache: dict[str, str] | None = None) -> str:
+    # Return the label ID, creating it if needed.
+    # Pass the same labels_cache dict across calls so labels().list runs only once.
+    if labels_cache is None:
+        labels_cache = {}
+    if not labels_cache:
+        labels_resp = gmail.users().labels().list(userId="me").execute()
+        labels_cache.update({lbl["name"]: lbl["id"] for lbl in labels_resp.get("labels", [])})
+    if label_name in labels_cache:
+        return labels_cache[label_name]
 
     new_lbl = gmail.users().labels().create(
         userId="me",
         body={"name": label_name, "labelListVisibility": "labelShow", "messageListVisibility": "show"}
     ).execute()
     print(f"✓ created Gmail label {label_name}")
+    labels_cache[label_name] = new_lbl["id"]
     return new_lbl["id"]
 
 # ─────────────────── argument parsing ────────────────────
@@ -45,17 +84,23 @@ args = parser.parse_args()
 from src.config import cfg
 from google.auth.transport.requests import Request as GoogleAuthRequest
 
-# Build credentials from refresh token (same as main.py)
+# Build credentials from refresh token (same as main.py), seeded with any
+# cached access token so a still-valid one makes creds.valid True up front
+token, expiry = load_cached_token(cfg.refresh_token) or (None, None)
 creds = Credentials(
-    None,
+    token,
     refresh_token=cfg.refresh_token,
     client_id=cfg.client_id,
     client_secret=cfg.client_secret,
     token_uri="https://oauth2.googleapis.com/token",
     scopes=SCOPES,
+    expiry=expiry,
 )
 if not creds.valid or creds.expired:
     creds.refresh(GoogleAuthRequest())
+    save_cached_token(creds)
+else:
+    print(f"✓ reusing cached access token from {TOKEN_CACHE}")
 
 gmail = build("gmail", "v1", credentials=creds)
 
@@ -100,7 +145,10 @@ watch_request = {
 
 resp = gmail.users().watch(userId="me", body=watch_request).execute()
 
-STATE_FILE.write_text(json.dumps({"last_id": resp["historyId"]}))
+# Write-then-rename so a crash never leaves a truncated checkpoint behind
+tmp = STATE_FILE.with_suffix(".json.tmp")
+tmp.write_text(json.dumps({"last_id": resp["historyId"]}))
+os.replace(tmp, STATE_FILE)
 print(f"✓ watch baseline saved to {STATE_FILE}")
 
 print("📬 Gmail watch created:")
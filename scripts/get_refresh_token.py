@@ -7,8 +7,8 @@ Interactive helper for personal-Gmail deployments
 
 • Uses an OAuth “Desktop App” client (client-id / client-secret)
 • Scope: https://www.googleapis.com/auth/gmail.modify  (read + label)
-• Prints a tiny JSON payload:   {"refresh_token": "...."}
-  ─ store that in Secret Manager, not on disk.
+• Prints base64(refresh_token) plus the legacy JSON payload {"refresh_token": "...."}
+  ─ store them in Secret Manager, not on disk.
 
 Run once per mailbox, then delete the script.
 """
@@ -20,17 +20,24 @@ import sys
 import textwrap
 from google_auth_oauthlib.flow import InstalledAppFlow
 
+try:
+    import orjson
+    _loads, _dumps = orjson.loads, orjson.dumps     # bytes in/out, no extra .encode()
+except ImportError:
+    _loads, _dumps = json.loads, lambda obj: json.dumps(obj).encode()
+
 SCOPES = ["https://www.googleapis.com/auth/gmail.modify"]
 ROOT = pathlib.Path(__file__).resolve().parent.parent
 CLIENT_FILE = ROOT / "oauth_client.json"      # downloaded from GCP → “Desktop App”
 
 def main() -> None:
-    if not CLIENT_FILE.exists():
+    # Read + parse the client file once (no separate exists() check and re-open)
+    try:
+        client_config = _loads(CLIENT_FILE.read_bytes())
+    except FileNotFoundError:
         sys.exit(f"❌  {CLIENT_FILE} not found — download OAuth client JSON first.")
 
-    flow = InstalledAppFlow.from_client_secrets_file(
-        str(CLIENT_FILE), SCOPES
-    )
+    flow = InstalledAppFlow.from_client_config(client_config, SCOPES)
     # For WSL/headless environments - manual URL copy/paste
     creds = flow.run_local_server(port=0, prompt="consent", open_browser=False)
 
@@ -39,9 +46,11 @@ def main() -> None:
         sys.exit("❌ No refresh-token received (did you tick 'Allow offline access'?).")
 
     payload = {"refresh_token": refresh_token}
-    print("\n🔑  COPY the line below into your secret store:\n")
-    b64 = base64.b64encode(json.dumps(payload).encode()).decode()
-    print(f"echo '{b64}' | gcloud secrets versions add gmail-refresh-token --data-file=-")
+    print("\n🔑  COPY the lines below into your secret store:\n")
+    raw_b64 = base64.b64encode(refresh_token.encode()).decode()
+    print(f"echo '{raw_b64}' | gcloud secrets versions add gmail-refresh-token-raw --data-file=-")
+    b64 = base64.b64encode(_dumps(payload)).decode()
+    print(f"echo '{b64}' | gcloud secrets versions add gmail-refresh-token --data-file=-  # legacy format")
     print("\n📋  (or paste the JSON into AWS Secrets Manager / HashiCorp Vault):")
     print(json.dumps(payload, indent=2))
     print(
@@ -53,7 +62,7 @@ def main() -> None:
             In your FastAPI app you’ll then load them with:
                 cid  = base64.b64decode(os.environ["GMAIL_CLIENT_ID_B64"]).decode()
                 csec = base64.b64decode(os.environ["GMAIL_CLIENT_SECRET_B64"]).decode()
-                rtok = json.loads(base64.b64decode(os.environ["GMAIL_REFRESH_B64"]))["refresh_token"]
+                rtok = base64.b64decode(os.environ["GMAIL_REFRESH_RAW_B64"]).decode()
             and build Credentials() in memory — no token.json ever written.
             """
         ).strip()
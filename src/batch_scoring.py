@@ -0,0 +1,157 @@
+"""
+OpenAI Batch API path for non-urgent mail
+-----------------------------------------
+• Emails that don't look urgent are appended to a JSONL queue on disk
+• The queue is submitted as one batch every BATCH_FLUSH_SECONDS or once
+  BATCH_MAX_REQUESTS lines are waiting (Batch API ≈ 50% cheaper, ≤24h)
+• A background loop polls submitted batches and hands each score back
+  through `on_scored(msg_id, score)` so the caller can apply labels
+Queue and submitted batch IDs live on disk, so a restart resumes polling.
+"""
+
+from __future__ import annotations
+import asyncio, json, logging, os, time
+from pathlib import Path
+from typing import Awaitable, Callable, List
+
+import openai
+
+from src.constants import BATCH_QUEUE_FILE, BATCH_STATE_FILE
+
+_PENDING = {"validating", "in_progress", "finalizing", "cancelling"}
+
+
+def _write_atomic(path: Path, text: str):
+    tmp = path.with_suffix(path.suffix + ".tmp")
+    tmp.write_text(text)
+    os.replace(tmp, path)
+
+
+class BatchScorer:
+    """Queue chat-completion requests for the Batch API and label results when ready."""
+
+    def __init__(
+        self,
+        client: openai.AsyncOpenAI,
+        model: str,
+        build_messages: Callable[[str, str], List[dict]],
+        on_scored: Callable[[str, float], Awaitable[None]],
+        *,
+        flush_seconds: float = 300,
+        max_requests: int = 1000,
+        poll_seconds: float = 60,
+    ):
+        self.client, self.model = client, model
+        self.build_messages, self.on_scored = build_messages, on_scored
+        self.flush_seconds, self.max_requests, self.poll_seconds = flush_seconds, max_requests, poll_seconds
+        self._lock = asyncio.Lock()  # guards the queue file and the state file, never labelling
+        try:
+            with BATCH_QUEUE_FILE.open() as fh:
+                self._queued = {json.loads(line)["custom_id"] for line in fh if line.strip()}
+        except (OSError, ValueError, KeyError):
+            self._queued = set()
+        self._since = time.monotonic()  # age of the oldest queued line (restart = now)
+
+    # ── queue ────────────────────────────────────────────────────────
+    @property
+    def _pending(self) -> int:
+        return len(self._queued)
+
+    async def enqueue(self, msg_id: str, subject: str, snippet: str):
+        """Append one request line; submits the batch once max_requests are waiting.
+
+        Ids already queued are skipped: OpenAI rejects a whole batch with duplicate custom_ids.
+        """
+        line = json.dumps({
+            "custom_id": msg_id,
+            "method": "POST",
+            "url": "/v1/chat/completions",
+            "body": {
+                "model": self.model,
+                "messages": self.build_messages(subject, snippet),
+                "max_tokens": 3,
+                "temperature": 0.1,
+            },
+        })
+        async with self._lock:
+            if msg_id in self._queued:
+                return
+            await asyncio.to_thread(self._append, line)
+            if not self._queued:
+                self._since = time.monotonic()
+            self._queued.add(msg_id)
+            if self._pending >= self.max_requests:
+                await self._flush_locked()
+
+    @staticmethod
+    def _append(line: str):
+        with BATCH_QUEUE_FILE.open("a") as fh:
+            fh.write(line + "\n")
+
+    async def _flush_locked(self):
+        """Upload the queue file and create a batch; caller holds self._lock."""
+        if not self._pending:
+            return
+        data = await asyncio.to_thread(BATCH_QUEUE_FILE.read_bytes)
+        upload = await self.client.files.create(file=("batch.jsonl", data), purpose="batch")
+        batch = await self.client.batches.create(
+            input_file_id=upload.id,
+            endpoint="/v1/chat/completions",
+            completion_window="24h",
+        )
+        state = await asyncio.to_thread(self._load_state)
+        state["submitted"].append(batch.id)
+        await asyncio.to_thread(_write_atomic, BATCH_STATE_FILE, json.dumps(state))
+        await asyncio.to_thread(BATCH_QUEUE_FILE.unlink, missing_ok=True)
+        logging.info("Submitted OpenAI batch %s with %d emails", batch.id, self._pending)
+        self._queued.clear()
+
+    # ── results ──────────────────────────────────────────────────────
+    @staticmethod
+    def _load_state() -> dict:
+        try:
+            return json.loads(BATCH_STATE_FILE.read_text())
+        except (OSError, ValueError):
+            return {"submitted": []}
+
+    async def _collect(self, batch_id: str) -> bool:
+        """Label the results of a finished batch; True once it needs no more polling."""
+        batch = await self.client.batches.retrieve(batch_id)
+        if batch.status in _PENDING:
+            return False
+        if batch.output_file_id:
+            content = await self.client.files.content(batch.output_file_id)
+            results = []
+            for line in content.text.splitlines():
+                record = json.loads(line)
+                try:
+                    reply = record["response"]["body"]["choices"][0]["message"]["content"]
+                    score = max(0.0, min(1.0, float(reply.strip())))
+                except (KeyError, IndexError, TypeError, ValueError, AttributeError):
+                    score = 0.0  # same fallback as realtime scoring
+                results.append((record["custom_id"], score))
+            # Concurrent labelling; the provider's semaphore bounds in-flight Gmail calls
+            await asyncio.gather(*(self.on_scored(msg_id, score) for msg_id, score in results))
+        if batch.status != "completed":
+            logging.error("OpenAI batch %s ended as %s; unscored emails stay unlabelled",
+                          batch_id, batch.status)
+        return True
+
+    async def run(self):
+        """Background loop: submit the queue when due and label finished batches."""
+        while True:
+            try:
+                async with self._lock:
+                    if self._pending and time.monotonic() - self._since >= self.flush_seconds:
+                        await self._flush_locked()
+                    submitted = (await asyncio.to_thread(self._load_state))["submitted"]
+                # Poll and label without the lock so enqueue() never waits on a big batch
+                finished = [b for b in submitted if await self._collect(b)]
+                if finished:
+                    async with self._lock:  # re-read: a flush may have added batches meanwhile
+                        state = await asyncio.to_thread(self._load_state)
+                        state["submitted"] = [b for b in state["submitted"] if b not in finished]
+                        await asyncio.to_thread(_write_atomic, BATCH_STATE_FILE, json.dumps(state))
+            except Exception:
+                logging.exception("Batch scoring loop failed; retrying in %ss", self.poll_seconds)
+            await asyncio.sleep(self.poll_seconds)
@@ -2,88 +2,338 @@
 """Unified config loader.
 
 Priority:
-1. Explicit OS env vars            (export GMAIL_REFRESH_B64=…)
+1. Explicit OS env vars            (export GMAIL_REFRESH_RAW_B64=…)
 2. .env file in project root       (for local dev)
-3. Google Secret Manager (prod)    (pull once at startup)
+3. Secret store (prod)             (pull once, on first use)
+   – Google Secret Manager, or AWS Secrets Manager with SECRET_BACKEND=aws
 
-Drop-in:  `from config import cfg`
+Drop-in:  `from src.config import get_cfg`  (or `cfg`, resolved lazily)
 """
 
-import base64, json, os
+import base64, os, tempfile, threading, time
+from abc import ABC, abstractmethod
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
 from pathlib import Path
-from typing import Any, Dict
+from typing import TYPE_CHECKING, Any, Dict
 
 from dotenv import load_dotenv
-from google.cloud import secretmanager  # safe to pip-install; ignored locally if GOOGLE_CLOUD_PROJECT unset
+try:
+    import orjson                                   # faster parse, bytes in/out
+    _loads, _dumps = orjson.loads, orjson.dumps
+except ImportError:                                 # stdlib fallback (pip install .[speedups])
+    import json
+    _loads, _dumps = json.loads, lambda obj: json.dumps(obj).encode()
+
+if TYPE_CHECKING:  # real import is deferred: grpc/protobuf are heavy and unused locally
+    from google.cloud import secretmanager
 
 # ───────────────────────
 # 1) .env for local dev
 # ───────────────────────
-load_dotenv()  # silently ignored if file absent
+if not os.getenv("K_SERVICE"):  # Cloud Run sets this; no .env there, skip the FS walk
+    load_dotenv()  # silently ignored if file absent
 
 # ───────────────────────
 # 2) helper
 # ───────────────────────
+_PROJECT = os.getenv("GOOGLE_CLOUD_PROJECT")  # only set in Cloud Run / GKE
+_SECRET_PREFIX = f"projects/{_PROJECT}/secrets/"  # built once, not per fetch
+_SM_CLIENT: "secretmanager.SecretManagerServiceClient | None" = None
+_SM_CLIENT_LOCK = threading.Lock()  # fan-out threads must share one client, not race to build it
+_SECRET_MEMO: dict[tuple[str, str, str], str] = {}
+
+def _get_sm_client() -> "secretmanager.SecretManagerServiceClient | None":
+    """Build the Secret Manager client on first use and reuse its gRPC channel after."""
+    global _SM_CLIENT
+    if _SM_CLIENT is None and _PROJECT:
+        with _SM_CLIENT_LOCK:
+            if _SM_CLIENT is None:
+                from google.cloud import secretmanager  # only paid when Secret Manager is actually used
+                _SM_CLIENT = secretmanager.SecretManagerServiceClient()
+    return _SM_CLIENT
+
 def _maybe_secret(project: str, name: str, key: str = "latest") -> str | None:
-    """If var missing & running in GCP, fetch Secret Manager payload once."""
-    if not project:
+    """Fetch one Secret Manager payload; memoised for the life of the process.
+
+    Returns "" when the secret/version does not exist (safe to remember) and
+    None for any other failure (permissions, network – not memoised, so the
+    next call retries).
+    """
+    if (project, name, key) in _SECRET_MEMO:
+        return _SECRET_MEMO[project, name, key]
+    value = _fetch_secret(project, name, key)
+    if value is not None:
+        _SECRET_MEMO[project, name, key] = value
+    return value
+
+def _fetch_secret(project: str, name: str, key: str) -> str | None:
+    client = _get_sm_client()
+    if client is None:
         return None
-    client = secretmanager.SecretManagerServiceClient()
-    secret_path = f"projects/{project}/secrets/{name}/versions/{key}"
+    prefix = _SECRET_PREFIX if project == _PROJECT else f"projects/{project}/secrets/"
+    secret_path = prefix + name + "/versions/" + key
+    from google.api_core.exceptions import NotFound  # ships with google-cloud-secret-manager
     try:
-        payload = client.access_secret_version(name=secret_path).payload.data
-        return payload.decode()
-    except Exception:
+        return client.access_secret_version(name=secret_path).payload.data.decode()
+    except NotFound:
+        return ""
+    except Exception as e:
+        print(f"⚠️  Secret Manager: could not read {name} ({type(e).__name__})")
         return None
 
-# ---- Resolve every variable once at import time ----
-_PROJECT = os.getenv("GOOGLE_CLOUD_PROJECT")  # only set in Cloud Run / GKE
+# Short-lived disk cache so rapid restarts / warm containers skip the RPCs
+_CACHE_FILE = Path(tempfile.gettempdir()) / ".sm_cache.json"
+_CACHE_TTL  = int(os.getenv("SECRET_CACHE_TTL", 600))  # seconds; 0 disables the disk cache
+
+def _load_disk_cache() -> dict:
+    """Return cached secrets, or {} if disabled, missing, corrupt or owned by someone else."""
+    if _CACHE_TTL <= 0:
+        return {}
+    try:
+        if _CACHE_FILE.stat().st_uid != os.getuid():
+            return {}
+        return _loads(_CACHE_FILE.read_bytes())
+    except (OSError, ValueError):
+        return {}
+
+def _save_disk_cache(entries: dict) -> None:
+    """Atomically write the cache owner-only (0600); failures only cost a refetch."""
+    if _CACHE_TTL <= 0:
+        return
+    try:
+        fd, tmp = tempfile.mkstemp(dir=_CACHE_FILE.parent, prefix=".sm_cache.")
+        with os.fdopen(fd, "wb") as fh:
+            fh.write(_dumps(entries))
+        os.replace(tmp, _CACHE_FILE)
+    except OSError:
+        pass
+
+def _secret_version(name: str) -> str:
+    """Pinned version for a secret: <NAME>_VERSION (e.g. GMAIL_REFRESH_TOKEN_VERSION=3), else latest.
+
+    Per secret only: Secret Manager numbers versions independently for each secret.
+    """
+    env_name = name.upper().replace("-", "_") + "_VERSION"
+    return os.getenv(env_name) or "latest"
+
+def _maybe_secrets(project: str, names: list[str]) -> dict[str, str]:
+    """If vars missing & running in GCP, fetch all Secret Manager payloads concurrently."""
+    if not project or not names:
+        return {}
+
+    keys = {name: _secret_version(name) for name in names}
+    cache, now, found, absent = _load_disk_cache(), time.time(), {}, set()
+    for name, key in keys.items():
+        hit = cache.get(f"{project}/{name}/{key}") or {}
+        fresh = now - hit.get("fetched_at", 0) < _CACHE_TTL
+        if hit.get("missing"):
+            if fresh:  # known not to exist: skip the RPC until the TTL lapses
+                absent.add(name)
+        # pinned versions are immutable, so only "latest" needs the TTL
+        elif hit and (key != "latest" or fresh):
+            found[name] = base64.b64decode(hit["value_b64"]).decode()
+
+    todo = [name for name in names if name not in found and name not in absent]
+    if not todo:
+        return found
+
+    # No native batch RPC in GCP – fan out so N secrets cost ~1 round trip
+    _get_sm_client()  # built here, once, before the threads need it
+    with ThreadPoolExecutor(max_workers=len(todo)) as pool:
+        values = dict(zip(todo, pool.map(lambda name: _maybe_secret(project, name, keys[name]), todo)))
+    fetched = {name: val for name, val in values.items() if val}
+
+    for name, val in values.items():
+        if val is None:  # transient/permission error: don't remember it
+            continue
+        entry = {"name": name, "fetched_at": now}
+        entry.update({"value_b64": base64.b64encode(val.encode()).decode()} if val else {"missing": True})
+        cache[f"{project}/{name}/{keys[name]}"] = entry
+    if any(val is not None for val in values.values()):
+        _save_disk_cache(cache)
+    return found | fetched
+
+# ───────────────────────
+# 3) secret backends
+# ───────────────────────
+class SecretBackend(ABC):
+    """Fetch several secrets in one go; missing or unreadable names are omitted."""
+    @abstractmethod
+    def get_many(self, names: list[str]) -> dict[str, str]: ...
+
+class GCPBackend(SecretBackend):
+    """Google Secret Manager – no batch RPC, so a threaded fan-out (+ disk cache)."""
+    def __init__(self, project: str):
+        self.project = project
+
+    def get_many(self, names: list[str]) -> dict[str, str]:
+        return _maybe_secrets(self.project, names)
+
+class AWSBackend(SecretBackend):
+    """AWS Secrets Manager – BatchGetSecretValue returns up to 20 secrets per call."""
+    BATCH = 20
 
-def _get(name: str, *, secret: str | None = None, required: bool = True) -> str | None:
-    val = os.getenv(name)
-    if val:
-        return val
-    if secret:
-        val = _maybe_secret(_PROJECT, secret)
-        if val:
-            return val
-    if required:
-        raise RuntimeError(f"Missing config: {name} (set env var or use Secret Manager)")
+    def __init__(self, region: str | None):
+        self.region = region
+        self._client = None  # built on first get_many; False once construction has failed
+
+    def _get_client(self):
+        if self._client is None:
+            try:
+                import boto3  # optional: pip install .[aws]
+                self._client = boto3.client("secretsmanager", region_name=self.region)
+            except Exception as e:  # boto3 missing, no region configured, ...
+                print(f"⚠️  AWS Secrets Manager unavailable ({type(e).__name__}: {e})")
+                self._client = False
+        return self._client
+
+    def get_many(self, names: list[str]) -> dict[str, str]:
+        client, found = self._get_client(), {}
+        if not client:
+            return found
+        for start in range(0, len(names), self.BATCH):
+            request = {"SecretIdList": names[start:start + self.BATCH]}
+            while True:
+                try:
+                    resp = client.batch_get_secret_value(**request)
+                except Exception as e:  # credentials, IAM, region: say so before "Missing config"
+                    print(f"⚠️  AWS Secrets Manager: batch read failed ({type(e).__name__}: {e})")
+                    break
+                for item in resp.get("SecretValues", []):
+                    if item.get("SecretString"):
+                        found[item["Name"]] = item["SecretString"]
+                for err in resp.get("Errors", []):  # per-secret failures don't raise
+                    print(f"⚠️  AWS Secrets Manager: {err.get('SecretId')}: "
+                          f"{err.get('ErrorCode')} {err.get('Message', '')}".rstrip())
+                if not resp.get("NextToken"):
+                    break
+                request["NextToken"] = resp["NextToken"]
+        return found
+
+def _select_backend() -> SecretBackend | None:
+    """AWS only with SECRET_BACKEND=aws (AWS_REGION alone is common on dev machines); else GCP if configured."""
+    kind = os.getenv("SECRET_BACKEND", "").lower()
+    if kind == "aws":
+        return AWSBackend(os.getenv("AWS_REGION"))
+    if kind in ("", "gcp") and _PROJECT:
+        return GCPBackend(_PROJECT)
     return None
 
+# ---- Resolve every variable once at import time ----
+# (env var, secret name, required)
+_VARS = (
+    ("GOOGLE_CLIENT_ID_B64",     "gmail-client-id",     True),
+    ("GOOGLE_CLIENT_SECRET_B64", "gmail-client-secret", True),
+    ("GMAIL_REFRESH_RAW_B64",    "gmail-refresh-token-raw", False),  # base64(token), no JSON
+    ("GMAIL_REFRESH_B64",        "gmail-refresh-token", False),  # legacy base64({"refresh_token": …})
+    ("OPENAI_API_KEY",           "openai-key",          True),
+    ("GMAIL_USER",               None,                  False),  # local only (no secret)
+)
+
+# Looked up only when the var it stands in for is still empty after the first batch
+_FALLBACKS = {"GMAIL_REFRESH_B64": "GMAIL_REFRESH_RAW_B64"}
+
+def _get_all(specs=_VARS) -> dict[str, str | None]:
+    """Read env vars first, then fetch only the still-missing secrets in one batch.
+
+    Fallback secrets (the legacy refresh token) cost a second batch, and only
+    for deployments that lack the preferred secret. If either refresh-token
+    var is exported, neither secret is fetched.
+    """
+    # Strip once here: `echo … | gcloud secrets versions add` leaves a trailing "\n"
+    vals = {name: (os.getenv(name) or "").strip() or None for name, _, _ in specs}
+    secrets = {name: secret for name, secret, _ in specs if secret}
+    backend = None
+
+    def fill(names: list[str]) -> None:
+        nonlocal backend
+        missing = [secrets[name] for name in names if not vals[name] and name in secrets]
+        if not missing:
+            return
+        backend = backend or _select_backend()
+        fetched = backend.get_many(missing) if backend else {}
+        for name in names:
+            if not vals[name] and name in secrets:
+                vals[name] = (fetched.get(secrets[name]) or "").strip() or None
+
+    # A fallback and the var it stands in for are one setting: either from env wins outright
+    from_env = {name for name, val in vals.items() if val}
+    settled = {n for pair in _FALLBACKS.items() if from_env & set(pair) for n in pair}
+    fill([name for name, _, _ in specs if name not in _FALLBACKS and name not in settled])
+    fill([name for name, primary in _FALLBACKS.items() if not vals[primary] and name not in settled])
+    for name, _, required in specs:
+        if not vals[name] and required:
+            raise RuntimeError(f"Missing config: {name} (set env var or use Secret Manager)")
+    return vals
+
+def _b64(value: str | None) -> str | None:
+    """Decode a base64 config value to text (None passes through)."""
+    return base64.b64decode(value).decode() if value else None
+
 class _Config:
     def __init__(self):
         # Allow graceful fallback for development
         try:
+            vals = _get_all()
             # client creds (base64)
-            self.CLIENT_ID_B64     = _get("GOOGLE_CLIENT_ID_B64",     secret="gmail-client-id")
-            self.CLIENT_SECRET_B64 = _get("GOOGLE_CLIENT_SECRET_B64", secret="gmail-client-secret")
-            self.REFRESH_B64       = _get("GMAIL_REFRESH_B64",        secret="gmail-refresh-token")
-            self.OPENAI_KEY        = _get("OPENAI_API_KEY",           secret="openai-key")
-            self.USER_EMAIL        = _get("GMAIL_USER", required=False)  # local only (no secret)
+            self.CLIENT_ID_B64     = vals["GOOGLE_CLIENT_ID_B64"]
+            self.CLIENT_SECRET_B64 = vals["GOOGLE_CLIENT_SECRET_B64"]
+            self.REFRESH_RAW_B64   = vals["GMAIL_REFRESH_RAW_B64"]
+            self.REFRESH_B64       = vals["GMAIL_REFRESH_B64"]
+            self.OPENAI_KEY        = vals["OPENAI_API_KEY"]
+            self.USER_EMAIL        = vals["GMAIL_USER"]
+            if not (self.REFRESH_RAW_B64 or self.REFRESH_B64):
+                raise RuntimeError("Missing config: GMAIL_REFRESH_RAW_B64 or GMAIL_REFRESH_B64 (set env var or use Secret Manager)")
         except RuntimeError as e:
             print(f"⚠️  Config warning: {e}")
             print("💡 For local dev, set environment variables or run scripts/get_refresh_token.py")
             # Set None values so properties can handle gracefully
-            self.CLIENT_ID_B64 = self.CLIENT_SECRET_B64 = self.REFRESH_B64 = self.OPENAI_KEY = self.USER_EMAIL = None
+            self.CLIENT_ID_B64 = self.CLIENT_SECRET_B64 = self.REFRESH_RAW_B64 = self.REFRESH_B64 = self.OPENAI_KEY = self.USER_EMAIL = None
+
+        self._decode()
 
-    # decoded helpers -------------------------------------------------
+    def _decode(self) -> None:
+        """Decode the base64/JSON credentials once; malformed values count as missing."""
+        try:
+            self._client_id     = _b64(self.CLIENT_ID_B64)
+            self._client_secret = _b64(self.CLIENT_SECRET_B64)
+            if self.REFRESH_RAW_B64:  # fast path: plain base64, no JSON wrapper
+                self._refresh_token = _b64(self.REFRESH_RAW_B64)
+            elif self.REFRESH_B64:
+                self._refresh_token = _loads(base64.b64decode(self.REFRESH_B64))["refresh_token"]
+            else:
+                self._refresh_token = None
+        except (ValueError, KeyError, TypeError) as e:
+            print(f"⚠️  Config warning: could not decode Gmail credentials ({type(e).__name__})")
+            self._client_id = self._client_secret = self._refresh_token = None
+
+    # decoded values (read-only) --------------------------------------
     @property
     def refresh_token(self) -> str:
-        if not self.REFRESH_B64:
+        if not self._refresh_token:
             raise RuntimeError("Gmail refresh token not configured")
-        return json.loads(base64.b64decode(self.REFRESH_B64))["refresh_token"]
+        return self._refresh_token
 
     @property
     def client_id(self) -> str:
-        if not self.CLIENT_ID_B64:
+        if not self._client_id:
             raise RuntimeError("Gmail client ID not configured")
-        return base64.b64decode(self.CLIENT_ID_B64).decode()
+        return self._client_id
 
     @property
     def client_secret(self) -> str:
-        if not self.CLIENT_SECRET_B64:
+        if not self._client_secret:
             raise RuntimeError("Gmail client secret not configured")
-        return base64.b64decode(self.CLIENT_SECRET_B64).decode()
+        return self._client_secret
+
+@lru_cache(maxsize=1)
+def get_cfg() -> _Config:
+    """Build the config on first use (may hit Secret Manager), then reuse it."""
+    return _Config()
 
-cfg = _Config()
+def __getattr__(name: str):
+    """Keep `from src.config import cfg` working while deferring the load to first access."""
+    if name == "cfg":
+        return get_cfg()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -2,4 +2,7 @@
 
 from pathlib import Path
 PROJECT_ROOT = Path(__file__).resolve().parent          # …/smart-inbox-prototype
-STATE_FILE   = PROJECT_ROOT / "watch_state.json"        # single source of truth
\ No newline at end of file
+STATE_FILE   = PROJECT_ROOT / "watch_state.json"        # single source of truth
+BATCH_QUEUE_FILE = PROJECT_ROOT / "batch_queue.jsonl"      # non-urgent mail awaiting a Batch API submit
+BATCH_STATE_FILE = PROJECT_ROOT / "batch_state.json"       # submitted OpenAI batch IDs still being polled
+MISSING_LOG = PROJECT_ROOT / "missing_messages.log"      # messages Gmail couldn't serve (no REDIS_URL)
@@ -6,27 +6,30 @@ Stateless event-driven smart-inbox prototype
 • Outlook stub ready for Graph later
 • No token.json on disk – creds built on the fly
 Prereqs:
-    pip install fastapi uvicorn openai google-api-python-client \
-                google-auth google-auth-httplib2 python-dotenv
+    pip install fastapi uvicorn openai httpx[http2] cachetools \
+                google-auth python-dotenv
 """
 
 from __future__ import annotations
-import base64, json, logging, os, pathlib
-from datetime import datetime
-from functools import lru_cache
+import asyncio, base64, bisect, functools, hashlib, json, logging, os, pathlib, random, re
+from datetime import datetime, timezone
 from typing import Optional, List
 
+import httpx
 import openai
+from cachetools import TTLCache
 from fastapi import FastAPI, HTTPException, Request
 from starlette.responses import Response, JSONResponse
 from google.oauth2.credentials import Credentials
 from google.auth.transport.requests import Request as GoogleAuthRequest
-from googleapiclient.discovery import build
-import googleapiclient.errors
 import google.auth.exceptions
 
-from src.config import cfg            # unified secrets loader
-from src.constants import STATE_FILE
+from src.config import cfg, _loads    # unified secrets loader; orjson-or-stdlib parser
+from src.state import load_last_id, record_missing, save_last_id
+from src.batch_scoring import BatchScorer
+from src.ratelimit import RateLimiter, estimate_tokens
+from src.tokens import clip_tokens, load_encoding
+from src.prefilter import DIGEST_SCORE, is_obvious_digest
 
 # ──────────────────────────────────────────────────────────────────────
 # Settings
@@ -40,9 +43,54 @@ class Settings:
     importance_threshold: float = float(os.getenv("IMPORTANCE_THRESHOLD", 0.5))
     urgent_threshold: float = float(os.getenv("URGENT_THRESHOLD", 0.8))
     medium_threshold: float = float(os.getenv("MEDIUM_THRESHOLD", 0.4))
+    score_batch_size: int = int(os.getenv("SCORE_BATCH_SIZE", 20))  # emails per OpenAI prompt
+    openai_rpm: int = int(os.getenv("OPENAI_RPM", 500))
+    openai_tpm: int = int(os.getenv("OPENAI_TPM", 200_000))
+    openai_max_concurrency: int = int(os.getenv("OPENAI_MAX_CONCURRENCY", 250))
+    openai_max_retries: int = int(os.getenv("OPENAI_MAX_RETRIES", 5))  # SDK retries 429s, honouring Retry-After
+    gmail_max_retries: int = int(os.getenv("GMAIL_MAX_RETRIES", 5))  # 429/5xx/rateLimitExceeded, honouring Retry-After
+    prefilter: bool = os.getenv("PREFILTER_DIGEST", "0") == "1"   # opt-in: label obvious bulk mail without OpenAI
+    workers: int = int(os.getenv("WORKERS", 1))  # uvicorn processes (see __main__)
+    batch_scoring: bool = os.getenv("BATCH_SCORING", "0") == "1"   # non-urgent mail via Batch API
+    batch_flush_seconds: float = float(os.getenv("BATCH_FLUSH_SECONDS", 300))
+    batch_max_requests: int = int(os.getenv("BATCH_MAX_REQUESTS", 1000))
 
 settings = Settings()
-openai.api_key = cfg.OPENAI_KEY
+
+# Ascending thresholds; bisect_right(score) indexes the tier whose band holds the score
+_TIER_THRESHOLDS = (settings.medium_threshold, settings.importance_threshold, settings.urgent_threshold)
+_TIERS = (
+    ("Digest", settings.label_digest),
+    ("Medium", settings.label_medium),
+    ("Urgent", settings.label_urgent),
+    ("Critical", settings.label_critical),
+)
+
+def tier_for(score: float) -> tuple[str, str]:
+    """(tier name, Gmail label) for a score; the one place thresholds are applied."""
+    return _TIERS[bisect.bisect_right(_TIER_THRESHOLDS, score)]
+# One pooled HTTP/2 client for OpenAI and Gmail REST: TLS handshakes are paid once per host
+http_client = httpx.AsyncClient(
+    http2=True,
+    timeout=30,
+    limits=httpx.Limits(max_connections=100, max_keepalive_connections=50),
+)
+@functools.cache
+def openai_client() -> openai.AsyncOpenAI:
+    """Async OpenAI client on the shared pool, built on first scoring call.
+
+    Deferred so importing src.main (test scripts, missing dev config) never fails;
+    a missing key surfaces here with a clear message instead.
+    """
+    if not cfg.OPENAI_KEY:
+        raise RuntimeError("OPENAI_API_KEY not configured (set env var or use Secret Manager)")
+    return openai.AsyncOpenAI(  # async: scoring must not block the event loop
+        api_key=cfg.OPENAI_KEY,
+        http_client=http_client,
+        max_retries=settings.openai_max_retries,
+    )
+
+openai_limiter = RateLimiter(settings.openai_rpm, settings.openai_tpm, settings.openai_max_concurrency)
 
 logging.basicConfig(
     level=logging.INFO,
@@ -50,73 +98,178 @@ logging.basicConfig(
 )
 
 # ──────────────────────────────────────────────────────────────────────
-# Gmail client helper (stateless)
+# Gmail credentials (stateless, shared)
 # ──────────────────────────────────────────────────────────────────────
-def gmail_client():
-    """Return a Gmail API client with a fresh access token (no token.json)."""
-    creds = Credentials(
-        None,
-        refresh_token=cfg.refresh_token,
-        client_id=cfg.client_id,
-        client_secret=cfg.client_secret,
-        token_uri="https://oauth2.googleapis.com/token",
-        scopes=["https://www.googleapis.com/auth/gmail.modify"],
-    )
-    if not creds.valid or creds.expired:
-        creds.refresh(GoogleAuthRequest())
-    return build("gmail", "v1", credentials=creds, cache_discovery=False)
+_creds: Optional[Credentials] = None
+_creds_lock = asyncio.Lock()
+
+def gmail_creds() -> Credentials:
+    """Process-wide Gmail credentials built from the refresh token (no token.json)."""
+    global _creds
+    if _creds is None:
+        _creds = Credentials(
+            None,
+            refresh_token=cfg.refresh_token,
+            client_id=cfg.client_id,
+            client_secret=cfg.client_secret,
+            token_uri="https://oauth2.googleapis.com/token",
+            scopes=["https://www.googleapis.com/auth/gmail.modify"],
+        )
+    return _creds
+
+def _expires_in(creds: Credentials) -> float:
+    """Seconds until the access token expires (0 if there is none yet)."""
+    if not creds.token or creds.expiry is None:
+        return 0.0
+    now = datetime.now(timezone.utc).replace(tzinfo=None)  # google-auth uses naive UTC
+    return (creds.expiry - now).total_seconds()
+
+async def refresh_gmail_creds(min_ttl: float = 60) -> Credentials:
+    """Refresh the shared credentials (once, off-loop) if they expire within min_ttl."""
+    async with _creds_lock:
+        creds = gmail_creds()
+        if _expires_in(creds) < min_ttl:
+            await asyncio.to_thread(creds.refresh, GoogleAuthRequest())
+        return creds
+
+async def keep_gmail_token_fresh():
+    """Background task: refresh the access token ~60s before it expires."""
+    while True:
+        try:
+            creds = await refresh_gmail_creds()
+            await asyncio.sleep(max(_expires_in(creds) - 60, 30))
+        except Exception:
+            logging.exception("Gmail token refresh failed; retrying in 30s")
+            await asyncio.sleep(30)
 
 # ──────────────────────────────────────────────────────────────────────
 # Provider abstraction
 # ──────────────────────────────────────────────────────────────────────
 class EmailProvider:
-    def fetch_message(self, msg_id: str) -> dict: ...
-    def label_message(self, msg_id: str, score: float): ...
+    async def fetch_message(self, msg_id: str) -> dict: ...
+    async def label_message(self, msg_id: str, score: float): ...
+    async def warm_labels(self, names: List[str]): ...
+    async def list_history(self, start_id: int, page_token: Optional[str] = None) -> dict: ...
+    async def current_history_id(self) -> int: ...
+
+GMAIL_API = "https://gmail.googleapis.com/gmail/v1/users/me"
+# Subject for the prompt; the rest feed src.prefilter
+METADATA_HEADERS = ("Subject", "From", "List-Unsubscribe", "Precedence", "Auto-Submitted")
+
+_RATE_LIMIT_REASONS = {"rateLimitExceeded", "userRateLimitExceeded"}  # Gmail sends these as 403
+
+def _gmail_transient(e: httpx.HTTPError) -> bool:
+    """True for errors worth retrying: network, 429, 5xx and Gmail's per-user quota 403s."""
+    if isinstance(e, httpx.TransportError):
+        return True
+    if not isinstance(e, httpx.HTTPStatusError):
+        return False
+    status = e.response.status_code
+    if status == 429 or status >= 500:
+        return True
+    if status == 403:
+        try:
+            errors = e.response.json()["error"].get("errors", [])
+        except (ValueError, KeyError, TypeError, AttributeError):
+            return False
+        return any(err.get("reason") in _RATE_LIMIT_REASONS for err in errors)
+    return False
+
+def _retry_after(e: httpx.HTTPError) -> float | None:
+    """Seconds asked for by a Retry-After header (capped at a minute), if any."""
+    if not isinstance(e, httpx.HTTPStatusError):
+        return None
+    try:
+        return min(float(e.response.headers["Retry-After"]), 60.0)
+    except (KeyError, ValueError):
+        return None
 
 class GmailProvider(EmailProvider):
-    _svc = None
-
-    def _service(self):
-        if self.__class__._svc is None:
-            self.__class__._svc = gmail_client()
-        return self.__class__._svc
-
-    @lru_cache(maxsize=2)
-    def _label_id(self, name: str) -> str:
-        svc = self._service()
-        for lab in svc.users().labels().list(userId="me").execute()["labels"]:
-            if lab["name"] == name:
-                return lab["id"]
-        # create if missing
+    """Gmail over async REST on the shared httpx client, bounded concurrency."""
+
+    def __init__(self, http: httpx.AsyncClient, max_concurrency: int = 10):
+        self._http = http
+        self._sem = asyncio.Semaphore(max_concurrency)
+        self._label_lock = asyncio.Lock()
+        self._label_ids: dict[str, str] = {}
+
+    async def _token(self) -> str:
+        """Return the shared access token, refreshing it within 60s of expiry."""
+        return (await refresh_gmail_creds()).token
+
+    async def _request(self, method: str, path: str, **kwargs) -> dict:
+        """Authorised Gmail REST call; retries transient errors, raises httpx.HTTPError otherwise."""
+        for attempt in range(settings.gmail_max_retries + 1):
+            try:
+                async with self._sem:  # released while backing off
+                    headers = {"Authorization": f"Bearer {await self._token()}"}
+                    resp = await self._http.request(method, GMAIL_API + path, headers=headers, **kwargs)
+                resp.raise_for_status()
+                return resp.json()
+            except httpx.HTTPError as e:
+                if attempt == settings.gmail_max_retries or not _gmail_transient(e):
+                    raise
+                delay = _retry_after(e) or min(2 ** attempt, 32) + random.random()
+                logging.warning("Gmail %s %s failed (%s); retry %d in %.1fs", method, path, e, attempt + 1, delay)
+                await asyncio.sleep(delay)
+
+    async def _create_label(self, name: str) -> str:
         body = {"name": name, "labelListVisibility": "labelShow"}
-        return svc.users().labels().create(userId="me", body=body).execute()["id"]
+        self._label_ids[name] = (await self._request("POST", "/labels", json=body))["id"]
+        return self._label_ids[name]
+
+    async def warm_labels(self, names: List[str]):
+        """List labels once at startup and create missing ones, so labelling is a dict lookup."""
+        async with self._label_lock:
+            labels = (await self._request("GET", "/labels")).get("labels", [])
+            self._label_ids.update({lab["name"]: lab["id"] for lab in labels})
+            for name in names:
+                if name not in self._label_ids:
+                    await self._create_label(name)
 
-    def fetch_message(self, msg_id: str) -> dict:
-        return self._service().users().messages().get(
-            userId="me", id=msg_id, format="full"
-        ).execute()
+    async def _label_id(self, name: str) -> str:
+        if name in self._label_ids:
+            return self._label_ids[name]
+        # Startup warm-up failed or the label is new: fall back to list-then-create
+        async with self._label_lock:  # concurrent labellers must not create duplicates
+            if name not in self._label_ids:
+                labels = (await self._request("GET", "/labels")).get("labels", [])
+                self._label_ids.update({lab["name"]: lab["id"] for lab in labels})
+            if name not in self._label_ids:
+                await self._create_label(name)
+            return self._label_ids[name]
 
-    def label_message(self, msg_id: str, score: float):
+    async def fetch_message(self, msg_id: str) -> dict:
+        """Headers we score on plus snippet; format=metadata skips the MIME body entirely."""
+        params = {"format": "metadata", "metadataHeaders": list(METADATA_HEADERS)}
+        return await self._request("GET", f"/messages/{msg_id}", params=params)
+
+    async def list_history(self, start_id: int, page_token: Optional[str] = None) -> dict:
+        """One page of messageAdded history since start_id."""
+        params = {"startHistoryId": str(start_id), "historyTypes": "messageAdded"}
+        if page_token:
+            params["pageToken"] = page_token
+        return await self._request("GET", "/history", params=params)
+
+    async def current_history_id(self) -> int:
+        return int((await self._request("GET", "/profile"))["historyId"])
+
+    async def label_message(self, msg_id: str, score: float):
         """Apply intelligent labels based on importance score"""
-        if score >= settings.urgent_threshold:
-            label = self._label_id(settings.label_critical)
-        elif score >= settings.importance_threshold:
-            label = self._label_id(settings.label_urgent)
-        elif score >= settings.medium_threshold:
-            label = self._label_id(settings.label_medium)
-        else:
-            label = self._label_id(settings.label_digest)
-            
-        self._service().users().messages().modify(
-            userId="me", id=msg_id, body={"addLabelIds": [label]}
-        ).execute()
+        label = await self._label_id(tier_for(score)[1])
+        await self._request("POST", f"/messages/{msg_id}/modify", json={"addLabelIds": [label]})
 
 class OutlookProvider(EmailProvider):
     """Stub – implement Graph API later."""
-    def fetch_message(self, msg_id: str) -> dict: raise NotImplementedError
-    def label_message(self, msg_id: str, score: float): raise NotImplementedError
+    async def fetch_message(self, msg_id: str) -> dict: raise NotImplementedError
+    async def label_message(self, msg_id: str, score: float): raise NotImplementedError
+    async def list_history(self, start_id: int, page_token: Optional[str] = None) -> dict: raise NotImplementedError
+    async def current_history_id(self) -> int: raise NotImplementedError
 
-provider: EmailProvider = GmailProvider()
+@functools.cache
+def get_provider() -> EmailProvider:
+    """The one provider instance, built on first use rather than at import."""
+    return GmailProvider(http_client)
 
 # ──────────────────────────────────────────────────────────────────────
 # Utility funcs
@@ -124,71 +277,184 @@ provider: EmailProvider = GmailProvider()
 def decode_pubsub_push(blob: dict) -> Optional[dict]:
     msg = blob.get("message", {})
     data = msg.get("data")
-    return json.loads(base64.b64decode(data)) if data else None
-
-def score_importance(subject: str, snippet: str) -> float:
-    prompt = (
-        "You are an intelligent email triage system for a finance professional. "
-        "Score emails 0.0-1.0 based on urgency and business impact.\n\n"
-        "HIGH PRIORITY (0.7-1.0):\n"
-        "- Trade execution issues, margin calls, system outages\n"
-        "- Client escalations, regulatory deadlines, risk alerts\n"
-        "- Meeting invites from executives or key clients\n"
-        "- Time-sensitive market opportunities\n\n"
-        "MEDIUM PRIORITY (0.3-0.6):\n"
-        "- Regular business communications, meeting requests\n"
-        "- Non-urgent reports, internal updates\n"
-        "- Vendor communications, routine notifications\n\n"
-        "LOW PRIORITY (0.0-0.2):\n"
-        "- Newsletters, marketing emails, social media\n"
-        "- Automated reports, non-critical updates\n"
-        "- Personal emails unrelated to work\n\n"
-        "Respond with ONLY the numeric score (e.g., 0.8).\n\n"
-        f"Subject: {subject}\n"
-        f"Body: {snippet[:800]}"
-    )
-    resp = openai.chat.completions.create(
-        model=settings.openai_model,
-        messages=[{"role": "user", "content": prompt}],
-        max_tokens=8,
-        temperature=0.1,
-    )
+    return _loads(base64.b64decode(data)) if data else None
+
+# Fixed system prompt: identical on every call so OpenAI can reuse the prefix
+TRIAGE_RUBRIC = (
+    "Score emails for a finance professional, 0.0-1.0 by urgency and business impact.\n"
+    "0.7-1.0: trade/margin/outage issues, client escalations, regulatory deadlines, "
+    "risk alerts, exec or key-client invites, time-sensitive market moves.\n"
+    "0.3-0.6: routine business mail, meeting requests, reports, vendor notices.\n"
+    "0.0-0.2: newsletters, marketing, social, automated updates, personal mail."
+)
+SNIPPET_TOKENS = 100  # body text the model sees (~400 chars); the subject carries most of the signal
+
+def _clip(snippet: str) -> str:
+    return clip_tokens(snippet, SNIPPET_TOKENS, settings.openai_model)
+
+# Subjects that must be labelled now; everything else may wait for the Batch API
+REALTIME_RE = re.compile(r"urgent|margin|trade|compliance", re.I)
+
+def triage_messages(subject: str, snippet: str) -> List[dict]:
+    """Chat messages asking for a single 0-1 score (shared by realtime and batch paths)."""
+    return [
+        {"role": "system", "content": TRIAGE_RUBRIC + " Reply with the number only."},
+        {"role": "user", "content": f"{subject}\n{_clip(snippet)}"},
+    ]
+
+# Pub/Sub redelivers and mailing lists repeat themselves: reuse scores for 24h
+_score_cache: TTLCache = TTLCache(maxsize=10_000, ttl=86_400)
+
+def _score_key(subject: str, snippet: str) -> bytes:
+    """Cache key for an email; only the first SNIPPET_TOKENS of the snippet reach the prompt."""
+    return hashlib.blake2b(subject.encode() + b"\0" + _clip(snippet).encode(), digest_size=16).digest()
+
+async def _chat(messages: List[dict], max_tokens: int, **kwargs):
+    """chat.completions.create under the RPM/TPM limiter."""
+    async with openai_limiter.slot(estimate_tokens(messages, max_tokens, settings.openai_model)):
+        return await openai_client().chat.completions.create(
+            model=settings.openai_model,
+            messages=messages,
+            max_tokens=max_tokens,
+            temperature=0.1,
+            **kwargs,
+        )
+
+async def score_importance(subject: str, snippet: str) -> float:
+    key = _score_key(subject, snippet)
+    if (cached := _score_cache.get(key)) is not None:
+        return cached
+    resp = await _chat(triage_messages(subject, snippet), max_tokens=3)
     try:   
         score = float(resp.choices[0].message.content.strip())
-        return max(0.0, min(1.0, score))  # Clamp to 0-1 range
+        score = _score_cache[key] = max(0.0, min(1.0, score))  # Clamp to 0-1 range
+        return score
     except ValueError: 
         return 0.0
 
+async def _score_chunk(items: List[tuple[str, str]]) -> List[float]:
+    """One OpenAI call for several emails; falls back to per-email calls on a bad reply."""
+    if len(items) == 1:
+        return [await score_importance(*items[0])]
+    listing = "\n\n".join(
+        f"{i}) {subject}\n{_clip(snippet)}"
+        for i, (subject, snippet) in enumerate(items, 1)
+    )
+    system = TRIAGE_RUBRIC + ' Reply with JSON {"scores": [...]}, one number per email, in order.'
+    resp = await _chat(
+        [{"role": "system", "content": system}, {"role": "user", "content": listing}],
+        max_tokens=8 * len(items) + 16,  # ~5 tokens per ", 0.85" plus the JSON wrapper, with headroom
+        response_format={"type": "json_object"},
+    )
+    try:
+        scores = _loads(resp.choices[0].message.content)["scores"]
+        if len(scores) != len(items):
+            raise ValueError(f"expected {len(items)} scores, got {len(scores)}")
+        scores = [max(0.0, min(1.0, float(score))) for score in scores]
+    except (ValueError, KeyError, TypeError) as e:
+        logging.warning("Batch score reply unusable (%s); scoring %d emails one by one", e, len(items))
+        return list(await asyncio.gather(*(score_importance(*item) for item in items)))
+    for item, score in zip(items, scores):  # only parsed scores are cached
+        _score_cache[_score_key(*item)] = score
+    return scores
+
+async def score_batch(items: List[tuple[str, str]]) -> List[float]:
+    """Score (subject, snippet) pairs with one prompt per SCORE_BATCH_SIZE uncached emails.
+
+    Only reads the cache: the scorers store parsed scores themselves, so the
+    0.0 fallback for an unusable reply is never pinned for 24h.
+    """
+    keys = [_score_key(*item) for item in items]
+    scores = {key: score for key in keys if (score := _score_cache.get(key)) is not None}
+    todo = list({key: item for key, item in zip(keys, items) if key not in scores}.items())
+    size = max(1, settings.score_batch_size)
+    chunks = [todo[i:i + size] for i in range(0, len(todo), size)]
+    results = await asyncio.gather(*(_score_chunk([item for _, item in chunk]) for chunk in chunks))
+    fresh = [score for chunk_scores in results for score in chunk_scores]
+    for (key, _), score in zip(todo, fresh):
+        scores[key] = score
+    return [scores[key] for key in keys]
+
 # ──────────────────────────────────────────────────────────────────────
 # FastAPI app
 # ──────────────────────────────────────────────────────────────────────
 app = FastAPI()
 last_id: Optional[int] = None
+batch_scorer: Optional[BatchScorer] = None
+push_queue: asyncio.Queue[int] = asyncio.Queue()  # historyIds acked but not yet processed
+
+@app.on_event("startup")
+async def start_token_refresher():
+    """Keep the shared Gmail token warm so pushes never wait on a refresh."""
+    app.state.token_task = asyncio.create_task(keep_gmail_token_fresh())
+
+@app.on_event("startup")
+async def load_tokenizer():
+    """Load the tiktoken encoding off-loop; on failure token counts fall back to estimates."""
+    await asyncio.to_thread(load_encoding, settings.openai_model)
+
+@app.on_event("startup")
+async def start_push_worker():
+    app.state.push_task = asyncio.create_task(push_worker())
+
+@app.on_event("shutdown")
+async def drain_and_close():
+    """Finish acknowledged pushes (bounded by Cloud Run's grace period), then close HTTP."""
+    try:
+        await asyncio.wait_for(push_queue.join(), timeout=8)
+    except asyncio.TimeoutError:
+        logging.warning("Shutdown with %d pushes unprocessed; next push resumes from last_id", push_queue.qsize())
+    await http_client.aclose()
+
+@app.on_event("startup")
+async def warm_label_cache():
+    """Resolve every tier label once so label_message never lists labels."""
+    names = [settings.label_critical, settings.label_urgent,
+             settings.label_medium, settings.label_digest]
+    try:
+        await get_provider().warm_labels(names)
+    except Exception as e:  # HTTP errors, RefreshError, unconfigured creds: /healthz must still come up
+        logging.warning("Label warm-up failed (%s); labels will resolve on first use", e)
+
+@app.on_event("startup")
+async def start_batch_scorer():
+    """Start the Batch API loop when BATCH_SCORING=1."""
+    global batch_scorer
+    if not settings.batch_scoring:
+        return
+    if settings.workers > 1:
+        # Every process would append to, flush and unlink the same queue file and
+        # overwrite batch_state.json from its own stale read, dropping batch ids.
+        raise RuntimeError("BATCH_SCORING=1 requires WORKERS=1 (the batch queue is per-host files)")
+    batch_scorer = BatchScorer(
+        openai_client(), settings.openai_model, triage_messages,
+        lambda msg_id, score: label_one(msg_id, "(batch)", score),
+        flush_seconds=settings.batch_flush_seconds,
+        max_requests=settings.batch_max_requests,
+    )
+    app.state.batch_task = asyncio.create_task(batch_scorer.run())
 
-def init_last_id():
+async def init_last_id():
     global last_id
     if last_id is not None: return
-    try:
-        last_id = int(json.loads(STATE_FILE.read_text())["last_id"])
-    except Exception:
-        prof = gmail_client().users().getProfile(userId="me").execute()
-        last_id = int(prof["historyId"]) - 1
+    last_id = await load_last_id()
+    if last_id is None:
+        last_id = await get_provider().current_history_id() - 1
 
 # ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
 @app.post("/gmail/push")
 async def gmail_push(req: Request):
-    global last_id
-    init_last_id()
+    await init_last_id()
 
+    body = await req.body()
     try:
-        blob = await req.json()
-    except Exception as e:
+        blob = _loads(body)
+    except ValueError as e:
         logging.error(f"Failed to parse request body: {e}")
-        body = await req.body()
         logging.error(f"Raw body: {body}")
         return Response(status_code=400)
         
-    logging.info(f"Received push notification: {json.dumps(blob, indent=2)}")
+    logging.info("Received push notification: %s", blob)  # formatted only if INFO is on
     
     data = decode_pubsub_push(blob)
     if data is None:
@@ -197,42 +463,121 @@ async def gmail_push(req: Request):
 
     hist_id = int(data["historyId"])
     if hist_id <= last_id:
-        return JSONResponse({"status": "skipped-old"})
+        return {"status": "skipped-old"}
+
+    # Ack now so Pub/Sub doesn't redeliver while we score. last_id only advances
+    # past a history page once it is labelled, so a failure or crash before then
+    # is recovered by the next push walking from the checkpoint again.
+    push_queue.put_nowait(hist_id)
+    return Response(status_code=204)
+
+async def push_worker():
+    """Process queued pushes one history walk at a time; a burst collapses into one walk."""
+    while True:
+        hist_id, taken = await push_queue.get(), 1
+        while not push_queue.empty():
+            hist_id, taken = max(hist_id, push_queue.get_nowait()), taken + 1
+        try:
+            await process_push(hist_id)
+        except Exception:
+            # last_id stops at the last fully labelled page, so this is where the retry starts
+            logging.exception("Push processing failed; the next push retries from last_id %s", last_id)
+        finally:
+            for _ in range(taken):
+                push_queue.task_done()
 
-    svc = gmail_client()
+async def process_push(hist_id: int):
+    """Label everything added since last_id, then advance the checkpoint."""
+    global last_id
+    if hist_id <= last_id:
+        return
     try:
         if last_id > 1:
-            changes = svc.users().history().list(
-                userId="me",
-                startHistoryId=str(last_id),
-                historyTypes=["messageAdded"]
-            ).execute().get("history", [])
-            for h in changes:
-                for m in h.get("messagesAdded", []):
-                    process_message(m["message"]["id"], m["message"])
-                last_id = max(last_id, int(h["id"]))
+            await process_history(last_id)
         else:
             last_id = hist_id
-    except googleapiclient.errors.HttpError as e:
-        if e.resp.status in (400, 404):
+    except httpx.HTTPStatusError as e:
+        if e.response.status_code in (400, 404):
             last_id = hist_id
         else:
             raise
 
-    STATE_FILE.write_text(json.dumps({"last_id": last_id}))
-    return JSONResponse({"status": "ok"})
+    last_id = await save_last_id(last_id)  # picks up progress made by other workers
 
 # ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
-def process_message(msg_id: str, meta: dict):
+async def process_history(start_id: int):
+    """Walk every history page, fetching page N+1 while page N is scored and labelled."""
+    global last_id
+    page = await get_provider().list_history(start_id)
+    while True:
+        token = page.get("nextPageToken")
+        next_page = asyncio.create_task(get_provider().list_history(start_id, token)) if token else None
+        try:
+            msg_ids, page_max = [], last_id
+            for h in page.get("history", []):
+                msg_ids += [m["message"]["id"] for m in h.get("messagesAdded", [])]
+                page_max = max(page_max, int(h["id"]))
+            await process_messages(msg_ids)
+            last_id = page_max  # only once the page is labelled; a failure above keeps it for retry
+        except BaseException:
+            if next_page:
+                next_page.cancel()
+            raise
+        if next_page is None:
+            return
+        page = await next_page
+
+async def read_message(msg_id: str) -> tuple[str, str, list] | None:
+    """Fetch one message and return (subject, snippet, headers), or None if Gmail can't serve it."""
     try:
-        raw = provider.fetch_message(msg_id)
-        headers = {h["name"]: h["value"] for h in raw["payload"]["headers"]}
-        subj = headers.get("Subject", "(no subject)")
-        score = score_importance(subj, raw.get("snippet", ""))
-        provider.label_message(msg_id, score)
-        logging.info("Scored %.2f on '%s'", score, subj[:60])
-    except googleapiclient.errors.HttpError as e:
+        raw = await get_provider().fetch_message(msg_id)
+    except httpx.HTTPError as e:
+        if _gmail_transient(e):
+            raise  # retries exhausted: fail the page so last_id stays put and it is walked again
         logging.error("Error fetching %s: %s", msg_id, e)
+        await record_missing(msg_id, str(e))
+        return None
+    headers = raw["payload"]["headers"]
+    subj = next((h["value"] for h in headers if h["name"] == "Subject"), "(no subject)")
+    return subj, raw.get("snippet", ""), headers
+
+async def label_one(msg_id: str, subj: str, score: float):
+    """Label one scored message; a permanent Gmail error only skips that message."""
+    try:
+        await get_provider().label_message(msg_id, score)
+        logging.info("Scored %.2f on '%s'", score, subj[:60])
+    except httpx.HTTPError as e:
+        if _gmail_transient(e):
+            raise  # retries exhausted: let the caller retry the whole page/batch
+        logging.error("Error labelling %s: %s", msg_id, e)
+
+async def process_messages(msg_ids: List[str]):
+    """Fetch, score (one prompt per batch) and label every message of one push.
+
+    Obvious bulk/social/auto-reply mail is labelled as digest without OpenAI
+    (unless its subject matches REALTIME_RE). With BATCH_SCORING=1 only
+    subjects matching REALTIME_RE (or already cached) are scored now; the
+    rest are queued for the cheaper OpenAI Batch API.
+    """
+    fetched = await asyncio.gather(*(read_message(msg_id) for msg_id in msg_ids))
+    items, obvious, deferred = [], [], []
+    for msg_id, msg in zip(msg_ids, fetched):  # one pass: each subject is scanned once
+        if msg is None:
+            continue
+        subj, snippet, headers = msg
+        realtime = REALTIME_RE.search(subj) is not None
+        if settings.prefilter and not realtime and is_obvious_digest(subj, headers):
+            obvious.append((msg_id, subj))
+        elif batch_scorer is not None and not realtime and _score_key(subj, snippet) not in _score_cache:
+            deferred.append((msg_id, subj, snippet))
+        else:
+            items.append((msg_id, subj, snippet))
+    await asyncio.gather(*(label_one(msg_id, subj, DIGEST_SCORE) for msg_id, subj in obvious))
+    for msg_id, subj, snippet in deferred:
+        await batch_scorer.enqueue(msg_id, subj, snippet)
+    scores = await score_batch([(subj, snippet) for _, subj, snippet in items])
+    await asyncio.gather(*(label_one(msg_id, subj, score)
+                           for (msg_id, subj, _), score in zip(items, scores)))
 
 # ──────────────────────────────────────────────────────────────────────
 @app.get("/healthz")
@@ -240,5 +585,7 @@ async def health(): return {"status": "up"}
 
 if __name__ == "__main__":
     import uvicorn
-    uvicorn.run("main:app", host="0.0.0.0",
-                port=int(os.getenv("PORT", 8080)), reload=False)
+    # Each worker holds its own Gmail client and last_id; src.state keeps the checkpoint shared
+    uvicorn.run("src.main:app", host="0.0.0.0",
+                port=int(os.getenv("PORT", 8080)), reload=False,
+                workers=settings.workers)
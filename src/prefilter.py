@@ -0,0 +1,43 @@
+"""
+Sub-millisecond pre-filter for obvious digest mail
+--------------------------------------------------
+Newsletters, social notifications and out-of-office replies announce
+themselves in their headers. Those are labelled as digest straight away
+instead of paying for an OpenAI round trip; anything ambiguous falls
+through to the model.
+
+Opt-in (PREFILTER_DIGEST=1): monitoring/alerting senders (SNS, CloudWatch,
+status pages) also send List-Unsubscribe, so with the filter on their
+alerts skip the model unless the subject matches main.REALTIME_RE.
+"""
+
+from __future__ import annotations
+import re
+
+DIGEST_SCORE = 0.1  # inside the rubric's LOW PRIORITY band (0.0-0.2)
+
+_PRECEDENCE = re.compile(r"^(bulk|junk)$", re.I)  # not "list": internal groups carry escalations
+_OOO_SUBJECT = re.compile(r"^(automatic reply|auto[- ]?reply|out of (the )?office)\b", re.I)
+_SOCIAL_SENDER = re.compile(
+    r"@([\w-]+\.)*(linkedin|facebookmail|twitter|x|medium|substack|quora|meetup)\.com\b", re.I
+)
+
+
+def is_obvious_digest(subject: str, headers: list[dict]) -> bool:
+    """True when headers alone mark the mail as bulk, social or an auto-reply.
+
+    `headers` is Gmail's raw payload list; one pass, no dict built.
+    """
+    if _OOO_SUBJECT.match(subject):
+        return True
+    for h in headers:
+        name, value = h["name"].lower(), h["value"].strip()
+        if name == "list-unsubscribe":  # bare List-Id is also set by internal Google Groups
+            return True
+        if name == "precedence" and _PRECEDENCE.match(value):
+            return True
+        if name == "auto-submitted" and value.lower() == "auto-replied":
+            return True  # out-of-office only; auto-generated alone doesn't mean bulk
+        if name == "from" and _SOCIAL_SENDER.search(value):
+            return True
+    return False
@@ -0,0 +1,60 @@
+"""
+Client-side OpenAI rate limiting
+--------------------------------
+Parallel scoring is only a win while we stay under the account's RPM/TPM
+limits; past them every call turns into 429 + retry. Requests wait here
+for a concurrency slot and for room in two per-minute token buckets
+(requests and tokens). 429s that still happen are retried by the OpenAI
+SDK itself, which honours Retry-After (see OPENAI_MAX_RETRIES).
+"""
+
+from __future__ import annotations
+import asyncio, time
+from contextlib import asynccontextmanager
+from typing import AsyncIterator
+
+from src.tokens import count_tokens
+
+
+class _Bucket:
+    """Token bucket refilled continuously at `per_minute / 60` units per second."""
+
+    def __init__(self, per_minute: float):
+        self.capacity = self.level = float(per_minute)
+        self.rate = per_minute / 60
+        self.stamp = time.monotonic()
+        self._lock = asyncio.Lock()  # FIFO: one waiter drains the bucket at a time
+
+    async def take(self, amount: float):
+        amount = min(amount, self.capacity)  # an oversized request must still pass eventually
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self.level = min(self.capacity, self.level + (now - self.stamp) * self.rate)
+                self.stamp = now
+                if self.level >= amount:
+                    self.level -= amount
+                    return
+                await asyncio.sleep((amount - self.level) / self.rate)
+
+
+class RateLimiter:
+    """Concurrency cap plus requests-per-minute and tokens-per-minute buckets."""
+
+    def __init__(self, rpm: int, tpm: int, max_concurrent: int):
+        self._sem = asyncio.Semaphore(max_concurrent)
+        self._requests = _Bucket(rpm)
+        self._tokens = _Bucket(tpm)
+
+    @asynccontextmanager
+    async def slot(self, tokens: int) -> AsyncIterator[None]:
+        """Hold a slot for one request expected to use about `tokens` tokens."""
+        async with self._sem:
+            await self._requests.take(1)
+            await self._tokens.take(tokens)
+            yield
+
+
+def estimate_tokens(messages: list[dict], max_tokens: int, model: str) -> int:
+    """Prompt + completion tokens one request can consume, for the TPM bucket."""
+    return sum(count_tokens(m["content"], model) for m in messages) + max_tokens
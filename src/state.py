@@ -0,0 +1,88 @@
+"""
+History checkpoint shared by every worker
+-----------------------------------------
+Several uvicorn workers (WORKERS=N) can receive pushes at once, each with
+its own in-memory `last_id`. The shared checkpoint only ever moves forward,
+so a slow worker can't roll it back.
+• REDIS_URL set → Redis (`smart_inbox:last_id`, `smart_inbox:missing`)
+• otherwise     → STATE_FILE under an flock + missing_messages.log,
+                  written off the event loop
+"""
+
+from __future__ import annotations
+import asyncio, fcntl, json, os, time
+from typing import Optional
+
+from src.constants import MISSING_LOG, STATE_FILE
+
+_LOCK_FILE = STATE_FILE.with_suffix(".lock")
+_LAST_ID_KEY = "smart_inbox:last_id"
+_MISSING_KEY = "smart_inbox:missing"
+
+# SET only if larger; returns whatever is stored afterwards
+_ADVANCE = """
+local cur = tonumber(redis.call('GET', KEYS[1]) or '0')
+local new = tonumber(ARGV[1])
+if new > cur then redis.call('SET', KEYS[1], ARGV[1]) return new end
+return cur
+"""
+
+_redis = None
+
+
+def _redis_client():
+    """Lazily connect to REDIS_URL; None keeps the file-based fallback."""
+    global _redis
+    url = os.getenv("REDIS_URL")
+    if url and _redis is None:
+        import redis.asyncio as aioredis  # optional: pip install .[redis]
+        _redis = aioredis.Redis.from_url(url, decode_responses=True)
+    return _redis
+
+
+# ── file fallback (blocking; always called via asyncio.to_thread) ────
+def _read_file() -> Optional[int]:
+    try:
+        return int(json.loads(STATE_FILE.read_text())["last_id"])
+    except (OSError, ValueError, KeyError, TypeError):
+        return None
+
+
+def _advance_file(last_id: int) -> int:
+    with _LOCK_FILE.open("a") as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        stored = max(last_id, _read_file() or 0)
+        tmp = STATE_FILE.with_suffix(".json.tmp")
+        tmp.write_text(json.dumps({"last_id": stored}))
+        os.replace(tmp, STATE_FILE)
+    return stored
+
+
+def _append_missing(line: str):
+    with MISSING_LOG.open("a") as fh:
+        fh.write(line + "\n")
+
+
+# ── public API ───────────────────────────────────────────────────────
+async def load_last_id() -> Optional[int]:
+    """Return the saved historyId, or None when there is no usable checkpoint."""
+    if (r := _redis_client()) is not None:
+        value = await r.get(_LAST_ID_KEY)
+        return int(value) if value else None
+    return await asyncio.to_thread(_read_file)
+
+
+async def save_last_id(last_id: int) -> int:
+    """Advance the checkpoint to last_id (never backwards) and return the stored value."""
+    if (r := _redis_client()) is not None:
+        return int(await r.eval(_ADVANCE, 1, _LAST_ID_KEY, last_id))
+    return await asyncio.to_thread(_advance_file, last_id)
+
+
+async def record_missing(msg_id: str, error: str):
+    """Remember a message Gmail couldn't serve so it can be investigated later."""
+    line = json.dumps({"id": msg_id, "error": error, "ts": int(time.time())})
+    if (r := _redis_client()) is not None:
+        await r.rpush(_MISSING_KEY, line)
+    else:
+        await asyncio.to_thread(_append_missing, line)
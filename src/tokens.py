@@ -0,0 +1,59 @@
+"""
+Token counting for prompt budgeting
+-----------------------------------
+tiktoken when installed (pip install .[speedups]), ~4 chars/token otherwise.
+The encoding is loaded once at startup by `load_encoding` (off the event
+loop: tiktoken may download its BPE file; set TIKTOKEN_CACHE_DIR to ship it
+instead). Until it is loaded, or if the load fails (no egress), counts stay
+estimates. Counts of repeated strings (the fixed system prompt) are
+memoised, so per-call cost is one encode of the email text.
+"""
+
+from __future__ import annotations
+import logging
+from functools import lru_cache
+
+try:
+    import tiktoken
+except ImportError:  # estimates only; budgets stay roughly right
+    tiktoken = None
+
+_ENCODINGS: dict = {}  # model -> tiktoken encoding; never fetched on the hot path
+
+
+def load_encoding(model: str) -> bool:
+    """Build the encoding for `model` (blocking, may hit the network); False if unavailable."""
+    if tiktoken is None:
+        return False
+    if model not in _ENCODINGS:
+        try:
+            try:
+                enc = tiktoken.encoding_for_model(model)
+            except KeyError:  # model newer than the installed tiktoken
+                enc = tiktoken.get_encoding("o200k_base")
+        except Exception as e:  # no egress to the BPE host, corrupt cache, ...
+            logging.warning("tiktoken encoding unavailable (%s); estimating ~4 chars/token", e)
+            return False
+        _ENCODINGS[model] = enc
+        count_tokens.cache_clear()  # drop estimates memoised before the load
+        clip_tokens.cache_clear()
+    return True
+
+
+@lru_cache(maxsize=256)
+def count_tokens(text: str, model: str) -> int:
+    """Number of tokens `text` costs for `model`."""
+    enc = _ENCODINGS.get(model)
+    if enc is None:
+        return -(-len(text) // 4)
+    return len(enc.encode(text))
+
+
+@lru_cache(maxsize=1024)
+def clip_tokens(text: str, max_tokens: int, model: str) -> str:
+    """The longest prefix of `text` that fits in `max_tokens` tokens."""
+    enc = _ENCODINGS.get(model)
+    if enc is None:
+        return text[:max_tokens * 4]
+    ids = enc.encode(text)
+    return text if len(ids) <= max_tokens else enc.decode(ids[:max_tokens])
@@ -1,6 +1,7 @@
 #!/usr/bin/env python3
 """Quick test of the email classification logic"""
 
+import asyncio
 import sys
 import os
 sys.path.append('src')
@@ -41,15 +42,25 @@ test_emails = [
     }
 ]
 
-print("Testing Email Classification System")
-print("=" * 50)
+async def main():
+    """Score every test email concurrently, then report whether each lands in the expected bucket"""
+    print("Testing Email Classification System")
+    print("=" * 50)
+
+    # One round trip for the whole suite; gather keeps results in input order
+    results = await asyncio.gather(
+        *(score_importance(email['subject'], email['snippet']) for email in test_emails),
+        return_exceptions=True,
+    )
+
+    for i, (email, score) in enumerate(zip(test_emails, results), 1):
+        print(f"\nTest {i}: {email['subject'][:50]}...")
+        print(f"Expected: {email['expected']} importance")
+        
+        if isinstance(score, Exception):
+            print(f"ERROR: {score}")
+            continue
 
-for i, email in enumerate(test_emails, 1):
-    print(f"\nTest {i}: {email['subject'][:50]}...")
-    print(f"Expected: {email['expected']} importance")
-    
-    try:
-        score = score_importance(email['subject'], email['snippet'])
         importance_level = "high" if score >= 0.5 else "low"
         
         print(f"Score: {score:.2f} -> {importance_level} importance")
@@ -57,9 +68,9 @@ for i, email in enumerate(test_emails, 1):
         # Check if prediction matches expectation
         correct = importance_level == email['expected']
         print(f"Result: {'✓ CORRECT' if correct else '✗ INCORRECT'}")
-        
-    except Exception as e:
-        print(f"ERROR: {e}")
 
-print("\n" + "=" * 50)
-print("Classification test complete!")
\ No newline at end of file
+    print("\n" + "=" * 50)
+    print("Classification test complete!")
+
+# One event loop for the whole run (the async OpenAI client is bound to it)
+asyncio.run(main())
\ No newline at end of file
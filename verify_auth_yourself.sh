@@ -20,14 +20,12 @@ python3 << 'EOF'
 import sys
 sys.path.append('src')
 from src.config import cfg
-import json, base64
 
 try:
-    # Decode credentials
-    refresh_data = json.loads(base64.b64decode(cfg.REFRESH_B64))
-    rt = refresh_data['refresh_token']
-    client_id = base64.b64decode(cfg.CLIENT_ID_B64).decode()
-    client_secret = base64.b64decode(cfg.CLIENT_SECRET_B64).decode()
+    # Decode credentials (raw or legacy JSON refresh-token format)
+    rt = cfg.refresh_token
+    client_id = cfg.client_id
+    client_secret = cfg.client_secret
     
     print(f"""
 curl -X POST https://oauth2.googleapis.com/token \\